@@ -1,13 +1,21 @@
 """Incident agent — analyzes K8s incidents and executes safe remediations."""
 
-import json
+import asyncio
+import heapq
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
+import orjson
 import structlog
+from cachetools import TTLCache
 from kubernetes import client as k8s_client
 from kubernetes import config as k8s_config
-from openai import AsyncOpenAI
+from urllib3.exceptions import HTTPError as TransportError
+from urllib3.exceptions import TimeoutError as TransportTimeout
 
+from src.agents.llm import LLMClient
 from src.config import Settings
 
 logger = structlog.get_logger()
@@ -15,15 +23,70 @@ logger = structlog.get_logger()
 # Safe remediations that can be auto-executed without human approval
 SAFE_ACTIONS = {"restart_pod", "scale_up_deployment"}
 
+# Upper bound (seconds) on any single K8s API call
+K8S_REQUEST_TIMEOUT = 10
+
+# Max concurrent remediation calls across all incidents, to protect the API server
+MAX_CONCURRENT_REMEDIATIONS = 10
+
+# Prompt budget: unhealthy pods listed, pods whose logs are fetched, log chars per pod
+MAX_UNHEALTHY_IN_PROMPT = 20
+MAX_LOG_PODS = 3
+MAX_LOG_CHARS = 2000
+
+
+# Built once so the system prefix is byte-identical across requests (prompt caching).
+# SAFE_ACTIONS is sorted: set ordering varies between processes.
+SYSTEM_PROMPT = (
+    "You are a senior SRE analyzing a Kubernetes incident. "
+    "Given the incident description and cluster state, provide:\n"
+    "1. root_cause: Most likely root cause\n"
+    "2. impact: Blast radius and user impact\n"
+    "3. remediation_steps: Ordered list of actions\n"
+    "4. safe_actions: Actions from this set that can be auto-executed: "
+    f"{sorted(SAFE_ACTIONS)}\n"
+    "5. prevention: How to prevent recurrence\n"
+    "Respond in JSON format."
+)
+
+
+def _transport_reason(e: TransportError) -> str:
+    """Short reason for a urllib3 failure (timeouts are often wrapped in MaxRetryError)."""
+    if isinstance(e, TransportTimeout) or isinstance(getattr(e, "reason", None), TransportTimeout):
+        return "timed out"
+    return type(e).__name__
+
+
+def _truncate(text: str, max_chars: int = MAX_LOG_CHARS) -> str:
+    """Keep the tail of a log — the most recent lines are the most relevant for crashes."""
+    return text if len(text) <= max_chars else text[-max_chars:]
+
 
 class IncidentAgent:
     """Analyzes incidents using LLM + K8s API, suggests and executes remediations."""
 
-    def __init__(self, settings: Settings):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+    def __init__(self, settings: Settings, llm: LLMClient):
+        self.llm = llm
         self.model = settings.openai_model
+        self.max_tokens = settings.openai_max_tokens
         self.namespace = settings.k8s_namespace
         self._k8s_initialized = False
+        self._v1: k8s_client.CoreV1Api | None = None
+        self._apps: k8s_client.AppsV1Api | None = None
+        # Dedicated pool for blocking K8s API calls, shared across requests
+        self._executor = ThreadPoolExecutor(max_workers=50, thread_name_prefix="k8s-io")
+        # Pod status per namespace, reused for a few seconds so one incident = one LIST
+        self._status_cache: TTLCache[str, list[dict]] = TTLCache(maxsize=32, ttl=5)
+        self._status_lock = threading.Lock()
+        self._remediation_slots = asyncio.Semaphore(MAX_CONCURRENT_REMEDIATIONS)
+
+    def close(self):
+        """Shut down the K8s I/O thread pool."""
+        self._executor.shutdown(wait=False)
+
+    async def _run_k8s(self, fn, *args):
+        """Run a blocking K8s call on the I/O pool without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
 
     def _init_k8s(self):
         """Lazy-init K8s client (may not be available in dev)."""
@@ -37,49 +100,81 @@ class IncidentAgent:
             except k8s_config.ConfigException:
                 logger.warning("k8s_not_available", msg="Running without K8s access")
                 return
+        self._v1 = k8s_client.CoreV1Api()
+        self._apps = k8s_client.AppsV1Api()
         self._k8s_initialized = True
 
     def _get_pod_status(self, namespace: str) -> list[dict]:
-        """Query K8s for pod status in the given namespace."""
+        """Query K8s for pod status in the given namespace.
+
+        Served from the API server watch cache (resourceVersion="0") rather than
+        a quorum read from etcd — results may be slightly stale, which is fine
+        for incident triage. Completed pods are filtered out server-side.
+        Results are cached per namespace for a few seconds.
+        """
+        with self._status_lock:
+            cached = self._status_cache.get(namespace)
+        if cached is not None:
+            return cached
         self._init_k8s()
         if not self._k8s_initialized:
             return [{"error": "K8s not available"}]
-        v1 = k8s_client.CoreV1Api()
-        pods = v1.list_namespaced_pod(namespace=namespace)
-        return [
-            {
+        pods = self._v1.list_namespaced_pod(
+            namespace=namespace,
+            resource_version="0",
+            resource_version_match="NotOlderThan",
+            field_selector="status.phase!=Succeeded",
+            _request_timeout=K8S_REQUEST_TIMEOUT,
+        )
+        status = []
+        for pod in pods.items:
+            container_statuses = pod.status.container_statuses or []
+            status.append({
                 "name": pod.metadata.name,
                 "phase": pod.status.phase,
-                "restarts": sum(
-                    cs.restart_count for cs in (pod.status.container_statuses or [])
-                ),
-                "ready": all(
-                    cs.ready for cs in (pod.status.container_statuses or [])
-                ),
-            }
-            for pod in pods.items
-        ]
+                "restarts": sum(cs.restart_count for cs in container_statuses),
+                "ready": all(cs.ready for cs in container_statuses),
+            })
+        with self._status_lock:
+            self._status_cache[namespace] = status
+        return status
 
     def _get_pod_logs(self, pod_name: str, namespace: str, tail: int = 50) -> str:
         """Fetch recent logs from a pod."""
         self._init_k8s()
         if not self._k8s_initialized:
             return "K8s not available — cannot fetch logs"
-        v1 = k8s_client.CoreV1Api()
         try:
-            return v1.read_namespaced_pod_log(
-                name=pod_name, namespace=namespace, tail_lines=tail
+            return self._v1.read_namespaced_pod_log(
+                name=pod_name,
+                namespace=namespace,
+                tail_lines=tail,
+                _request_timeout=K8S_REQUEST_TIMEOUT,
             )
         except k8s_client.ApiException as e:
             return f"Failed to fetch logs: {e.reason}"
+        except TransportError as e:
+            return f"Failed to fetch logs: {_transport_reason(e)}"
 
     def _restart_pod(self, pod_name: str, namespace: str) -> str:
         """Delete a pod to trigger restart via its controller."""
         self._init_k8s()
         if not self._k8s_initialized:
             return "K8s not available"
-        v1 = k8s_client.CoreV1Api()
-        v1.delete_namespaced_pod(name=pod_name, namespace=namespace)
+        # Runs after the LLM call — report failures instead of failing the incident
+        try:
+            self._v1.delete_namespaced_pod(
+                name=pod_name, namespace=namespace, _request_timeout=K8S_REQUEST_TIMEOUT
+            )
+        except k8s_client.ApiException as e:
+            logger.warning("pod_restart_failed", pod=pod_name, namespace=namespace, reason=e.reason)
+            return f"Failed to restart pod {pod_name}: {e.reason}"
+        except TransportError as e:
+            reason = _transport_reason(e)
+            logger.warning("pod_restart_failed", pod=pod_name, namespace=namespace, reason=reason)
+            return f"Failed to restart pod {pod_name}: {reason}"
+        with self._status_lock:
+            self._status_cache.pop(namespace, None)
         logger.info("pod_restarted", pod=pod_name, namespace=namespace)
         return f"Pod {pod_name} deleted — controller will recreate it"
 
@@ -88,72 +183,104 @@ class IncidentAgent:
         self._init_k8s()
         if not self._k8s_initialized:
             return "K8s not available"
-        apps = k8s_client.AppsV1Api()
-        apps.patch_namespaced_deployment_scale(
+        self._apps.patch_namespaced_deployment_scale(
             name=deployment,
             namespace=namespace,
             body={"spec": {"replicas": replicas}},
+            _request_timeout=K8S_REQUEST_TIMEOUT,
         )
         logger.info("deployment_scaled", deployment=deployment, replicas=replicas)
         return f"Deployment {deployment} scaled to {replicas} replicas"
 
+    @property
+    def k8s_ready(self) -> bool:
+        """Whether a K8s client is already configured — checking never loads config."""
+        return self._k8s_initialized
+
+    async def prefetch_status(self, namespace: str) -> None:
+        """Warm the pod-status cache so a following analyze() skips the K8s round-trip."""
+        await self._run_k8s(self._get_pod_status, namespace)
+
+    async def _remediate(self, action: str, unhealthy: list[dict], namespace: str) -> str | None:
+        """Execute one safe action; returns None for actions that don't apply."""
+        if action == "restart_pod" and unhealthy:
+            async with self._remediation_slots:
+                return await self._run_k8s(self._restart_pod, unhealthy[0]["name"], namespace)
+        if action == "scale_up_deployment":
+            return "Requires deployment name — skipped"
+        return None
+
     async def analyze(
         self, description: str, severity: str, namespace: str
     ) -> dict[str, Any]:
         """Full incident analysis: gather context, LLM analysis, remediation."""
         # Gather K8s context
-        pod_status = self._get_pod_status(namespace)
-        unhealthy = [p for p in pod_status if not p.get("ready") or p.get("restarts", 0) > 3]
+        # K8s client is blocking — run it off the event loop
+        pod_status = await self._run_k8s(self._get_pod_status, namespace)
+        total_pods, unhealthy, phases = 0, [], defaultdict(int)
+        for pod in pod_status:
+            total_pods += 1
+            phases[str(pod.get("phase"))] += 1
+            if not pod.get("ready") or pod.get("restarts", 0) > 3:
+                unhealthy.append(pod)
 
-        # Get logs from unhealthy pods
-        pod_logs = {}
-        for pod in unhealthy[:3]:  # limit to 3 pods to avoid token overflow
-            pod_logs[pod["name"]] = self._get_pod_logs(pod["name"], namespace)
+        # Only the most-restarting unhealthy pods go into the prompt, so its
+        # size is bounded regardless of namespace size
+        top_unhealthy = heapq.nlargest(
+            MAX_UNHEALTHY_IN_PROMPT, unhealthy, key=lambda p: p.get("restarts", 0)
+        )
 
-        # LLM analysis
-        context = json.dumps(
-            {"pod_status": pod_status, "unhealthy_pods": unhealthy, "pod_logs": pod_logs},
-            indent=2,
+        # Get logs from the worst of those concurrently
+        log_targets = top_unhealthy[:MAX_LOG_PODS]
+        logs = await asyncio.gather(
+            *(self._run_k8s(self._get_pod_logs, pod["name"], namespace) for pod in log_targets)
         )
-        response = await self.client.chat.completions.create(
+        pod_logs = {pod["name"]: _truncate(log) for pod, log in zip(log_targets, logs)}
+
+        # LLM analysis
+        # Compact JSON — indentation only costs prompt tokens
+        context = orjson.dumps(
+            {
+                "pod_counts": {"total": total_pods, "unhealthy": len(unhealthy), "by_phase": phases},
+                "unhealthy_pods": top_unhealthy,
+                "pod_logs": pod_logs,
+            }
+        ).decode()
+        response = await self.llm.chat(
+            agent="incident",
             model=self.model,
             messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a senior SRE analyzing a Kubernetes incident. "
-                        "Given the incident description and cluster state, provide:\n"
-                        "1. root_cause: Most likely root cause\n"
-                        "2. impact: Blast radius and user impact\n"
-                        "3. remediation_steps: Ordered list of actions\n"
-                        "4. safe_actions: Actions from this set that can be auto-executed: "
-                        f"{SAFE_ACTIONS}\n"
-                        "5. prevention: How to prevent recurrence\n"
-                        "Respond in JSON format."
-                    ),
-                },
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {
                     "role": "user",
                     "content": f"Incident: {description}\nSeverity: {severity}\n\nCluster state:\n{context}",
                 },
             ],
             temperature=0.2,
+            max_tokens=self.max_tokens,
             response_format={"type": "json_object"},
         )
-        analysis = json.loads(response.choices[0].message.content)
+        analysis = orjson.loads(response.choices[0].message.content)
 
         # Auto-execute safe remediations for high severity
         executed = []
         if severity == "high" and analysis.get("safe_actions"):
-            for action in analysis["safe_actions"]:
-                if action == "restart_pod" and unhealthy:
-                    result = self._restart_pod(unhealthy[0]["name"], namespace)
-                    executed.append({"action": action, "result": result})
-                elif action == "scale_up_deployment":
-                    executed.append({"action": action, "result": "Requires deployment name — skipped"})
+            # Each known action runs once, all concurrently; the model sometimes
+            # returns objects instead of names — those are skipped
+            actions = list(dict.fromkeys(
+                a for a in analysis["safe_actions"] if isinstance(a, str) and a in SAFE_ACTIONS
+            ))
+            results = await asyncio.gather(
+                *(self._remediate(action, unhealthy, namespace) for action in actions)
+            )
+            executed = [
+                {"action": action, "result": result}
+                for action, result in zip(actions, results)
+                if result is not None
+            ]
 
         return {
             "analysis": analysis,
-            "cluster_context": {"total_pods": len(pod_status), "unhealthy": len(unhealthy)},
+            "cluster_context": {"total_pods": total_pods, "unhealthy": len(unhealthy)},
             "auto_executed": executed,
         }
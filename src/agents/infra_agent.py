@@ -1,52 +1,100 @@
 """Infrastructure agent — generates Terraform plans with policy validation."""
 
-import json
+import re
 from typing import Any
 
 import structlog
-from openai import AsyncOpenAI
 
+from src.agents.llm import LLMClient
 from src.config import Settings
 
 logger = structlog.get_logger()
 
-# Policy rules — violations block provisioning
+# Policy rules — violations block provisioning. Checks run against the set of
+# keywords found in the plan (see _scan_keywords).
 POLICIES = {
     "no_public_s3": {
         "description": "S3 buckets must not have public access",
-        "check": lambda tf: "public" not in tf.lower() or "block_public" in tf.lower(),
+        "check": lambda hits: "public" not in hits or "block_public" in hits,
     },
     "enforce_tagging": {
         "description": "All resources must have environment and owner tags",
-        "check": lambda tf: "tags" in tf.lower(),
+        "check": lambda hits: "tags" in hits,
     },
     "instance_size_limit": {
         "description": "EC2 instances must not exceed xlarge in non-prod",
-        "check": lambda tf: "2xlarge" not in tf or "4xlarge" not in tf,
+        "check": lambda hits: "2xlarge" not in hits and "4xlarge" not in hits,
     },
     "encryption_required": {
         "description": "Storage resources must have encryption enabled",
-        "check": lambda tf: "encrypted" in tf.lower() or "kms" in tf.lower() or "s3" not in tf.lower(),
+        "check": lambda hits: "encrypted" in hits or "kms" in hits or "s3" not in hits,
     },
 }
 
+# Region/environment go in the user turn so this prefix is identical across
+# requests and can hit the provider's prompt cache
+SYSTEM_PROMPT = (
+    "You are a senior cloud architect. Generate production-ready Terraform code "
+    "for the AWS region and environment given in the request.\n"
+    "Requirements:\n"
+    "- Use terraform >= 1.7 syntax\n"
+    "- Include proper tags (environment, owner, managed_by=terraform)\n"
+    "- Enable encryption for all storage\n"
+    "- Use private subnets where possible\n"
+    "- Block public access on S3\n"
+    "- Include security groups with least-privilege rules\n\n"
+    "Return JSON with:\n"
+    "- terraform_code: the HCL code as a string\n"
+    "- resources: list of resources being created\n"
+    "- explanation: brief description of what's being provisioned"
+)
+
+# Monthly USD cost per resource type
+COST_MAP = {
+    "aws_instance": {"t3.micro": 8, "t3.small": 15, "t3.medium": 30, "t3.large": 60, "t3.xlarge": 120},
+    "aws_eks_cluster": {"base": 73},
+    "aws_rds_instance": {"db.t3.micro": 13, "db.t3.small": 25, "db.t3.medium": 50},
+    "aws_s3_bucket": {"base": 2},
+    "aws_elasticache": {"base": 25},
+}
+
+# Every keyword the policy and cost checks look for, matched in a single pass.
+# The lookahead finds the longest keyword starting at each offset; shorter
+# keywords contained in it (e.g. "s3" in "s3_bucket") are implied by the match.
+_KEYWORDS = {"public", "block_public", "tags", "2xlarge", "4xlarge", "encrypted", "kms", "s3"} | {
+    resource.replace("aws_", "") for resource in COST_MAP
+}
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_KEYWORDS, key=len, reverse=True))) + "))"
+)
+_IMPLIED = {kw: {k for k in _KEYWORDS if k in kw} for kw in _KEYWORDS}
+
+
+def _scan_keywords(terraform_code: str) -> set[str]:
+    """Return the policy/cost keywords present in the Terraform code (case-insensitive)."""
+    hits: set[str] = set()
+    for match in _KEYWORD_RE.finditer(terraform_code.lower()):
+        hits |= _IMPLIED[match.group(1)]
+    return hits
+
 
 class InfrastructureAgent:
     """Converts natural language to Terraform plans with policy guardrails."""
 
-    def __init__(self, settings: Settings):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+    def __init__(self, settings: Settings, llm: LLMClient):
+        self.llm = llm
         self.model = settings.openai_model
+        self.max_tokens = settings.openai_max_tokens
         self.region = settings.aws_region
 
-    def _validate_policies(self, terraform_code: str, environment: str) -> list[dict]:
-        """Run policy checks against generated Terraform code."""
+    def _validate_policies(self, hits: set[str], environment: str) -> list[dict]:
+        """Run policy checks against keywords found in generated Terraform code."""
         violations = []
         for name, policy in POLICIES.items():
             # Skip instance size check for production
             if name == "instance_size_limit" and environment == "production":
                 continue
-            if not policy["check"](terraform_code):
+            if not policy["check"](hits):
                 violations.append({
                     "policy": name,
                     "description": policy["description"],
@@ -54,19 +102,12 @@ class InfrastructureAgent:
                 })
         return violations
 
-    def _estimate_cost(self, terraform_code: str) -> dict:
+    def _estimate_cost(self, hits: set[str]) -> dict:
         """Rough cost estimation based on resource types found in the plan."""
-        cost_map = {
-            "aws_instance": {"t3.micro": 8, "t3.small": 15, "t3.medium": 30, "t3.large": 60, "t3.xlarge": 120},
-            "aws_eks_cluster": {"base": 73},
-            "aws_rds_instance": {"db.t3.micro": 13, "db.t3.small": 25, "db.t3.medium": 50},
-            "aws_s3_bucket": {"base": 2},
-            "aws_elasticache": {"base": 25},
-        }
         estimated_monthly = 0.0
         resources_found = []
-        for resource, costs in cost_map.items():
-            if resource.replace("aws_", "") in terraform_code.lower():
+        for resource, costs in COST_MAP.items():
+            if resource.replace("aws_", "") in hits:
                 base_cost = costs.get("base", list(costs.values())[0])
                 estimated_monthly += base_cost
                 resources_found.append(resource)
@@ -80,38 +121,30 @@ class InfrastructureAgent:
         self, request: str, environment: str, dry_run: bool
     ) -> dict[str, Any]:
         """Generate a Terraform plan from natural language with policy validation."""
-        response = await self.client.chat.completions.create(
+        plan = await self.llm.chat_json_cached(
+            agent="infrastructure",
             model=self.model,
             messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {
-                    "role": "system",
-                    "content": (
-                        "You are a senior cloud architect. Generate production-ready Terraform code "
-                        f"for AWS region {self.region}, environment: {environment}.\n"
-                        "Requirements:\n"
-                        "- Use terraform >= 1.7 syntax\n"
-                        "- Include proper tags (environment, owner, managed_by=terraform)\n"
-                        "- Enable encryption for all storage\n"
-                        "- Use private subnets where possible\n"
-                        "- Block public access on S3\n"
-                        "- Include security groups with least-privilege rules\n\n"
-                        "Return JSON with:\n"
-                        "- terraform_code: the HCL code as a string\n"
-                        "- resources: list of resources being created\n"
-                        "- explanation: brief description of what's being provisioned"
-                    ),
+                    "role": "user",
+                    "content": f"AWS region: {self.region}\nEnvironment: {environment}\n\n{request}",
                 },
-                {"role": "user", "content": request},
             ],
             temperature=0.2,
+            max_tokens=self.max_tokens,
             response_format={"type": "json_object"},
         )
-        plan = json.loads(response.choices[0].message.content)
+        return self.review(plan, environment, dry_run)
+
+    def review(self, plan: dict, environment: str, dry_run: bool) -> dict[str, Any]:
+        """Run policy validation and cost estimation on an LLM-generated plan."""
         terraform_code = plan.get("terraform_code", "")
 
-        # Policy validation
-        violations = self._validate_policies(terraform_code, environment)
-        cost = self._estimate_cost(terraform_code)
+        # Policy validation — scan the plan once, then check keyword hits
+        hits = _scan_keywords(terraform_code)
+        violations = self._validate_policies(hits, environment)
+        cost = self._estimate_cost(hits)
 
         approved = len(violations) == 0
         if violations:
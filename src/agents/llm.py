@@ -0,0 +1,136 @@
+"""Shared LLM client — one connection pool and global rate limits for all agents."""
+
+import hashlib
+from typing import Any
+
+import httpx
+import orjson
+import structlog
+from aiolimiter import AsyncLimiter
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+from prometheus_client import Counter
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+from src.cache import RedisCache
+from src.config import Settings
+
+logger = structlog.get_logger()
+
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens consumed", ["agent", "kind"])
+
+# Transient failures retried by LLMClient.chat
+_RETRYABLE = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class LLMResponseTruncated(RuntimeError):
+    """A JSON-mode completion hit max_tokens, so its body is not valid JSON."""
+
+
+# Longest provider-requested delay honored, in seconds
+MAX_RETRY_AFTER = 300
+
+_rate_limit_backoff = wait_exponential(multiplier=1.5, min=30, max=MAX_RETRY_AFTER)
+_error_backoff = wait_exponential(multiplier=1.5, min=1, max=30)
+
+
+def _wait_retry_after(retry_state: RetryCallState) -> float:
+    """Sleep for the provider's Retry-After on 429s, else back off exponentially."""
+    exc = retry_state.outcome.exception()
+    if not isinstance(exc, RateLimitError):
+        return _error_backoff(retry_state)
+    for header, per_second in (("retry-after-ms", 1000), ("retry-after", 1)):
+        try:
+            delay = float(exc.response.headers[header]) / per_second
+        except (KeyError, ValueError):
+            continue
+        # Only trust sane values — never retry instantly or stall a request indefinitely
+        if 0 < delay <= MAX_RETRY_AFTER:
+            return delay
+    return _rate_limit_backoff(retry_state)
+
+
+class LLMClient:
+    """Wraps AsyncOpenAI with process-wide RPM/TPM limiting and retries on transient errors."""
+
+    def __init__(self, settings: Settings):
+        # SDK retries are disabled — chat() retries instead, so every attempt
+        # goes back through the rate limiters
+        self.client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            timeout=settings.openai_timeout,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            ),
+        )
+        self.tpm = settings.openai_tpm
+        self.max_retries = settings.openai_max_retries
+        self._requests = AsyncLimiter(settings.openai_rpm, 60)
+        self._tokens = AsyncLimiter(settings.openai_tpm, 60)
+        self.cache = RedisCache(settings, prefix="llm")
+
+    def _estimate_tokens(self, messages: list[dict], max_tokens: int) -> int:
+        """Rough token budget for a call: ~4 chars per prompt token plus the completion cap."""
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        return min(prompt_chars // 4 + max_tokens, self.tpm)
+
+    async def chat(self, agent: str, **kwargs: Any):
+        """Rate-limited chat completion — kwargs are passed to chat.completions.create.
+
+        Transient errors are retried up to OPENAI_MAX_RETRIES times. Token usage
+        is recorded under the calling agent's name. JSON-mode responses cut off
+        by max_tokens raise LLMResponseTruncated.
+        """
+        tokens = self._estimate_tokens(kwargs["messages"], kwargs.get("max_tokens", 0))
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception_type(_RETRYABLE),
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=_wait_retry_after,
+            reraise=True,
+        ):
+            with attempt:
+                async with self._requests:
+                    await self._tokens.acquire(tokens)
+                    response = await self.client.chat.completions.create(**kwargs)
+        if response.usage:
+            LLM_TOKENS.labels(agent=agent, kind="prompt").inc(response.usage.prompt_tokens)
+            LLM_TOKENS.labels(agent=agent, kind="completion").inc(response.usage.completion_tokens)
+        if kwargs.get("response_format") and response.choices[0].finish_reason == "length":
+            raise LLMResponseTruncated(
+                f"{agent} response exceeded max_tokens={kwargs.get('max_tokens')} — "
+                "raise OPENAI_MAX_TOKENS or narrow the request"
+            )
+        return response
+
+    async def chat_json_cached(self, agent: str, **kwargs: Any) -> dict:
+        """JSON chat completion served from Redis when the identical request was seen before.
+
+        Only for idempotent prompts (plans, workflow reviews) — not live cluster state.
+        """
+        key = hashlib.blake2b(orjson.dumps(kwargs, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        cached = await self.cache.get(key)
+        if cached is not None:
+            logger.info("llm_cache_hit", agent=agent)
+            return orjson.loads(cached)
+        response = await self.chat(agent, **kwargs)
+        content = response.choices[0].message.content
+        result = orjson.loads(content)
+        await self.cache.set(key, content.encode())
+        return result
+
+    async def close(self):
+        """Release the shared HTTP connection pool and Redis connections."""
+        await self.client.close()
+        await self.cache.close()
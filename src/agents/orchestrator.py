@@ -1,33 +1,84 @@
 """Agent orchestrator — classifies intent and routes to specialist agents."""
 
+import asyncio
+import hashlib
 from typing import Any
 
+import orjson
 import structlog
-from openai import AsyncOpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential
+from cachetools import TTLCache
 
+from src.agents import infra_agent, pipeline_agent
 from src.agents.incident_agent import IncidentAgent
 from src.agents.infra_agent import InfrastructureAgent
+from src.agents.llm import LLMClient
 from src.agents.pipeline_agent import PipelineAgent
 from src.config import Settings
 
 logger = structlog.get_logger()
 
+# Max requests classified per LLM call in classify_many
+CLASSIFY_BATCH_SIZE = 20
+
+# Labels worth caching — anything else is a parse miss and gets re-classified
+INTENTS = {"incident", "infrastructure", "pipeline"}
+
+# Namespace used for incidents that arrive as free text
+ROUTE_NAMESPACE = "default"
+
+
+# Classify and answer in one call; incidents still go through the incident
+# agent since they need live cluster state. Built from the specialists' own
+# prompts so the requirements and response schemas stay in one place.
+_FUSED_PROMPT = (
+    "Classify the DevOps request into exactly one category: "
+    "incident, infrastructure, or pipeline, and answer it in the same response.\n"
+    "Return JSON with:\n"
+    "- intent: the category\n"
+    "- response: null for incident, otherwise the JSON object described below "
+    "for that category\n\n"
+    f"## infrastructure\n{infra_agent.SYSTEM_PROMPT}\n\n"
+    f"## pipeline\n{pipeline_agent.SYSTEM_PROMPT}"
+)
+
+
+def _intent_key(text: str) -> str:
+    """Cache key for intent classification — insensitive to case and surrounding whitespace."""
+    return hashlib.blake2b(text.strip().lower().encode(), digest_size=16).hexdigest()
+
 
 class AgentOrchestrator:
     """Routes DevOps requests to the appropriate specialist agent using LLM classification."""
 
     def __init__(self, settings: Settings):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        # One client (connection pool + rate limits) shared by every agent
+        self.llm = LLMClient(settings)
         self.model = settings.openai_model
-        self.incident_agent = IncidentAgent(settings)
-        self.infra_agent = InfrastructureAgent(settings)
-        self.pipeline_agent = PipelineAgent(settings)
+        self.max_tokens = settings.openai_max_tokens
+        self.region = settings.aws_region
+        self.incident_agent = IncidentAgent(settings, self.llm)
+        self.infra_agent = InfrastructureAgent(settings, self.llm)
+        self.pipeline_agent = PipelineAgent(settings, self.llm)
+        self._intent_cache: TTLCache[str, str] = TTLCache(maxsize=1024, ttl=3600)
+
+    async def close(self):
+        """Release the shared HTTP connection pool and K8s I/O threads."""
+        await self.llm.close()
+        self.incident_agent.close()
+
+    def _remember_intent(self, key: str, intent: str) -> None:
+        """Cache a classification, unless the model returned something unusable."""
+        if intent in INTENTS:
+            self._intent_cache[key] = intent
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=10))
     async def _classify_intent(self, text: str) -> str:
-        """Use LLM to classify the request type."""
-        response = await self.client.chat.completions.create(
+        """Use LLM to classify the request type (cached for repeated requests)."""
+        key = _intent_key(text)
+        cached = self._intent_cache.get(key)
+        if cached is not None:
+            return cached
+        response = await self.llm.chat(
+            agent="orchestrator",
             model=self.model,
             messages=[
                 {
@@ -45,8 +96,46 @@ class AgentOrchestrator:
         )
         intent = response.choices[0].message.content.strip().lower()
         logger.info("intent_classified", intent=intent, text=text[:80])
+        self._remember_intent(key, intent)
         return intent
 
+    async def classify_many(self, texts: list[str]) -> list[str]:
+        """Classify many requests with one LLM call per batch instead of one per request."""
+        keys = [_intent_key(text) for text in texts]
+        intents = {}
+        for key in keys:
+            cached = self._intent_cache.get(key)
+            if cached is not None:
+                intents[key] = cached
+        pending = list({key: text for key, text in zip(keys, texts) if key not in intents}.items())
+        for start in range(0, len(pending), CLASSIFY_BATCH_SIZE):
+            batch = pending[start:start + CLASSIFY_BATCH_SIZE]
+            numbered = "\n".join(f"{i}. {text}" for i, (_, text) in enumerate(batch, 1))
+            response = await self.llm.chat(
+                agent="orchestrator",
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": (
+                            "Classify each numbered DevOps request into exactly one category: "
+                            "incident, infrastructure, or pipeline. "
+                            'Respond in JSON mapping each number to its category, e.g. {"1": "incident"}.'
+                        ),
+                    },
+                    {"role": "user", "content": numbered},
+                ],
+                temperature=0,
+                max_tokens=10 * len(batch) + 20,
+                response_format={"type": "json_object"},
+            )
+            labels = orjson.loads(response.choices[0].message.content)
+            for i, (key, _) in enumerate(batch, 1):
+                intents[key] = str(labels.get(str(i), "unknown")).strip().lower()
+                self._remember_intent(key, intents[key])
+        logger.info("intents_classified", count=len(texts), llm_classified=len(pending))
+        return [intents[key] for key in keys]
+
     async def handle_incident(
         self, description: str, severity: str, namespace: str
     ) -> dict[str, Any]:
@@ -68,11 +157,10 @@ class AgentOrchestrator:
         logger.info("handling_pipeline", repo=repo)
         return await self.pipeline_agent.optimize(repo, workflow_content)
 
-    async def route(self, text: str) -> dict[str, Any]:
-        """Auto-classify and route a free-text DevOps request."""
-        intent = await self._classify_intent(text)
+    async def _dispatch(self, intent: str, text: str) -> dict[str, Any]:
+        """Send a free-text request to the handler for an already-classified intent."""
         handlers = {
-            "incident": lambda: self.handle_incident(text, "medium", "default"),
+            "incident": lambda: self.handle_incident(text, "medium", ROUTE_NAMESPACE),
             "infrastructure": lambda: self.handle_infrastructure(text, "staging", True),
             "pipeline": lambda: self.handle_pipeline("", text),
         }
@@ -80,3 +168,63 @@ class AgentOrchestrator:
         if not handler:
             return {"error": f"Unknown intent: {intent}", "supported": list(handlers)}
         return await handler()
+
+    async def route(self, text: str) -> dict[str, Any]:
+        """Auto-classify and route a free-text DevOps request.
+
+        When K8s is already connected and the intent isn't cached, the pod-status
+        LIST for ROUTE_NAMESPACE starts alongside the classifier call so an
+        incident's K8s round-trip overlaps the LLM call. A running LIST can't be
+        cancelled, so infrastructure/pipeline requests on that path pay for one
+        watch-cache read. Without a K8s connection nothing is prefetched.
+        """
+        prefetch = None
+        if self.incident_agent.k8s_ready and _intent_key(text) not in self._intent_cache:
+            prefetch = asyncio.create_task(self.incident_agent.prefetch_status(ROUTE_NAMESPACE))
+            # K8s errors are left for analyze() to surface on its own fetch
+            prefetch.add_done_callback(lambda t: t.cancelled() or t.exception())
+        intent = await self._classify_intent(text)
+        if prefetch and intent == "incident":
+            await asyncio.wait([prefetch])
+        return await self._dispatch(intent, text)
+
+    async def route_many(self, texts: list[str]) -> list[dict[str, Any]]:
+        """Batch-classify and route many free-text requests, preserving input order."""
+        intents = await self.classify_many(texts)
+        results = await asyncio.gather(
+            *(self._dispatch(intent, text) for intent, text in zip(intents, texts)),
+            return_exceptions=True,
+        )
+        # One failing item must not discard the rest of the batch
+        responses = []
+        for intent, result in zip(intents, results):
+            if isinstance(result, Exception):
+                logger.error("route_many_item_failed", intent=intent, error=str(result))
+                result = {"error": str(result), "intent": intent}
+            responses.append(result)
+        return responses
+
+    async def route_fused(self, text: str) -> dict[str, Any]:
+        """Classify and answer a free-text request in a single LLM call where possible."""
+        fused = await self.llm.chat_json_cached(
+            agent="orchestrator",
+            model=self.model,
+            messages=[
+                {"role": "system", "content": _FUSED_PROMPT},
+                {"role": "user", "content": f"AWS region: {self.region}\nEnvironment: staging\n\n{text}"},
+            ],
+            temperature=0.2,
+            max_tokens=self.max_tokens,
+            response_format={"type": "json_object"},
+        )
+        intent = str(fused.get("intent", "")).strip().lower()
+        answer = fused.get("response")
+        self._remember_intent(_intent_key(text), intent)
+        logger.info("intent_classified", intent=intent, text=text[:80], fused=True)
+
+        if intent == "infrastructure" and isinstance(answer, dict) and answer.get("terraform_code"):
+            return self.infra_agent.review(answer, "staging", True)
+        if intent == "pipeline" and isinstance(answer, dict) and isinstance(answer.get("suggestions"), list):
+            return self.pipeline_agent.review(text, answer["suggestions"])
+        # Incidents (or incomplete answers) take the regular specialist path
+        return await self._dispatch(intent, text)
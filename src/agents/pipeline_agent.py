@@ -1,28 +1,47 @@
 """Pipeline agent — analyzes GitHub Actions workflows and suggests optimizations."""
 
-import json
 from typing import Any
 
 import structlog
 import yaml
-from openai import AsyncOpenAI
 
+from src.agents.llm import LLMClient
 from src.config import Settings
 
+# Prefer the libyaml-backed loader; fall back to pure Python if PyYAML was built without it
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 logger = structlog.get_logger()
 
+# Module-level so the system prefix is identical across requests (prompt caching)
+SYSTEM_PROMPT = (
+    "You are a CI/CD expert specializing in GitHub Actions optimization. "
+    "Analyze the workflow and provide concrete improvements.\n"
+    "For each suggestion, include:\n"
+    "- category: caching|parallelization|security|cost|speed\n"
+    "- description: what to change and why\n"
+    "- before: the current YAML snippet (if applicable)\n"
+    "- after: the improved YAML snippet\n"
+    "- estimated_time_saved: rough estimate in minutes\n"
+    "Return JSON with a 'suggestions' array."
+)
+
 
 class PipelineAgent:
     """Analyzes CI/CD workflows and suggests concrete optimizations."""
 
-    def __init__(self, settings: Settings):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+    def __init__(self, settings: Settings, llm: LLMClient):
+        self.llm = llm
         self.model = settings.openai_model
+        self.max_tokens = settings.openai_max_tokens
 
     def _parse_workflow(self, content: str) -> dict:
         """Parse a GitHub Actions workflow YAML and extract structure."""
         try:
-            workflow = yaml.safe_load(content)
+            workflow = yaml.load(content, Loader=YamlLoader)
         except yaml.YAMLError:
             return {"error": "Invalid YAML"}
 
@@ -38,18 +57,24 @@ class PipelineAgent:
 
         for job_name, job_config in jobs.items():
             steps = job_config.get("steps", [])
+            step_dicts = [s for s in steps if isinstance(s, dict)]
+            uses = [str(s["uses"]) if s.get("uses") else "" for s in step_dicts]
+            strategy = job_config.get("strategy", {})
             analysis["jobs"][job_name] = {
                 "steps": len(steps),
                 "runs_on": job_config.get("runs-on", "unknown"),
                 "needs": job_config.get("needs", []),
-                "has_cache": any("cache" in str(s).lower() for s in steps),
-                "has_matrix": "matrix" in str(job_config.get("strategy", {})),
-                "has_artifacts": any("upload-artifact" in str(s) or "download-artifact" in str(s) for s in steps),
-                "uses_actions": [
-                    s.get("uses", "").split("@")[0]
-                    for s in steps
-                    if isinstance(s, dict) and s.get("uses")
-                ],
+                # actions/cache, or a setup-* action with its built-in `cache:` input enabled
+                "has_cache": any(u.startswith("actions/cache") for u in uses)
+                or any(
+                    isinstance(s.get("with"), dict) and s["with"].get("cache") not in (None, False, "false", "")
+                    for s in step_dicts
+                ),
+                "has_matrix": isinstance(strategy, dict) and "matrix" in strategy,
+                "has_artifacts": any(
+                    u.startswith(("actions/upload-artifact", "actions/download-artifact")) for u in uses
+                ),
+                "uses_actions": [u.split("@")[0] for u in uses if u],
             }
         return analysis
 
@@ -95,46 +120,34 @@ class PipelineAgent:
 
         return suggestions
 
-    async def optimize(self, repo: str, workflow_content: str) -> dict[str, Any]:
-        """Full pipeline analysis: parse, detect quick wins, LLM deep analysis."""
-        # Structural analysis
+    def review(self, workflow_content: str, suggestions: list[dict]) -> dict[str, Any]:
+        """Combine structural analysis and quick wins with LLM suggestions."""
         analysis = self._parse_workflow(workflow_content)
         quick_wins = self._detect_quick_wins(analysis)
+        return {
+            "workflow_analysis": analysis,
+            "quick_wins": quick_wins,
+            "ai_suggestions": suggestions,
+            "summary": {
+                "total_jobs": analysis.get("total_jobs", 0),
+                "optimization_opportunities": len(quick_wins) + len(suggestions),
+            },
+        }
 
-        # LLM deep analysis for nuanced suggestions
-        response = await self.client.chat.completions.create(
+    async def optimize(self, repo: str, workflow_content: str) -> dict[str, Any]:
+        """Full pipeline analysis: LLM deep analysis, then structural quick wins."""
+        llm_suggestions = await self.llm.chat_json_cached(
+            agent="pipeline",
             model=self.model,
             messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a CI/CD expert specializing in GitHub Actions optimization. "
-                        "Analyze the workflow and provide concrete improvements.\n"
-                        "For each suggestion, include:\n"
-                        "- category: caching|parallelization|security|cost|speed\n"
-                        "- description: what to change and why\n"
-                        "- before: the current YAML snippet (if applicable)\n"
-                        "- after: the improved YAML snippet\n"
-                        "- estimated_time_saved: rough estimate in minutes\n"
-                        "Return JSON with a 'suggestions' array."
-                    ),
-                },
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {
                     "role": "user",
                     "content": f"Repository: {repo}\n\nWorkflow:\n```yaml\n{workflow_content}\n```",
                 },
             ],
             temperature=0.3,
+            max_tokens=self.max_tokens,
             response_format={"type": "json_object"},
         )
-        llm_suggestions = json.loads(response.choices[0].message.content)
-
-        return {
-            "workflow_analysis": analysis,
-            "quick_wins": quick_wins,
-            "ai_suggestions": llm_suggestions.get("suggestions", []),
-            "summary": {
-                "total_jobs": analysis.get("total_jobs", 0),
-                "optimization_opportunities": len(quick_wins) + len(llm_suggestions.get("suggestions", [])),
-            },
-        }
+        return self.review(workflow_content, llm_suggestions.get("suggestions", []))
@@ -0,0 +1,42 @@
+"""Redis-backed response cache — a cache outage never fails a request."""
+
+import structlog
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from src.config import Settings
+
+logger = structlog.get_logger()
+
+
+class RedisCache:
+    """Thin async get/set wrapper around Redis with a default TTL."""
+
+    def __init__(self, settings: Settings, prefix: str):
+        # Short timeouts so a hung Redis becomes a RedisError (a miss), not a stalled request
+        self._redis = aioredis.from_url(
+            settings.redis_url,
+            socket_connect_timeout=settings.redis_timeout,
+            socket_timeout=settings.redis_timeout,
+        )
+        self.prefix = prefix
+        self.ttl = settings.llm_cache_ttl
+
+    async def get(self, key: str) -> bytes | None:
+        """Return the cached value, or None on a miss or Redis error."""
+        try:
+            return await self._redis.get(f"{self.prefix}:{key}")
+        except RedisError as e:
+            logger.warning("cache_get_failed", error=str(e))
+            return None
+
+    async def set(self, key: str, value: bytes) -> None:
+        """Store a value with the configured TTL; errors are logged and ignored."""
+        try:
+            await self._redis.set(f"{self.prefix}:{key}", value, ex=self.ttl)
+        except RedisError as e:
+            logger.warning("cache_set_failed", error=str(e))
+
+    async def close(self):
+        """Close the Redis connection pool."""
+        await self._redis.aclose()
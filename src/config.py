@@ -10,10 +10,17 @@ class Settings(BaseSettings):
 
     openai_api_key: str = ""
     openai_model: str = "gpt-4o"
+    openai_timeout: float = 30.0
+    openai_max_retries: int = 3
+    openai_max_tokens: int = 1024
+    openai_rpm: int = 500
+    openai_tpm: int = 30000
     k8s_namespace: str = "devops-ai"
     aws_region: str = "eu-north-1"
     log_level: str = "INFO"
     redis_url: str = "redis://localhost:6379"
+    redis_timeout: float = 0.5
+    llm_cache_ttl: int = 86400
     prometheus_port: int = 9090
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
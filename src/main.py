@@ -16,7 +16,13 @@ logger = structlog.get_logger()
 
 # ── Metrics ─────────────────────────────────────────────────────────────────
 REQUEST_COUNT = Counter("api_requests_total", "Total API requests", ["endpoint", "status"])
-REQUEST_LATENCY = Histogram("api_request_duration_seconds", "Request latency", ["endpoint"])
+# LLM-backed endpoints routinely take 1-30s; the default buckets top out at 10s
+REQUEST_LATENCY = Histogram(
+    "api_request_duration_seconds",
+    "Request latency",
+    ["endpoint"],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 20, 30, 60, 120),
+)
 
 # ── Request/Response models ─────────────────────────────────────────────────
 
@@ -55,6 +61,7 @@ async def lifespan(app: FastAPI):
     orchestrator = AgentOrchestrator(settings)
     logger.info("platform_started", model=settings.openai_model, namespace=settings.k8s_namespace)
     yield
+    await orchestrator.close()
     logger.info("platform_shutdown")
 
 